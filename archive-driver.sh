@@ -1,48 +1,74 @@
 #!/bin/bash
 
-STREAM_URL="https://listen.wbor.org:8000/stream"
+# Configuration, overridable from the environment (unset means default)
+STREAM_URL="${STREAM_URL-https://listen.wbor.org:8000/stream}"
+ARCHIVE_DIR="${ARCHIVE_DIR-/archive}"
+SEGMENT_DURATION="${SEGMENT_DURATION-3600}"
+
+if [ -z "$STREAM_URL" ] || [ -z "$ARCHIVE_DIR" ]; then
+    echo "STREAM_URL and ARCHIVE_DIR must not be empty" >&2
+    exit 1
+fi
+if ! [[ "$SEGMENT_DURATION" =~ ^[1-9][0-9]*$ ]]; then
+    echo "SEGMENT_DURATION must be a positive number of seconds" >&2
+    exit 1
+fi
+
+# Recordings are named and filed by UTC (note the "Z" in filenames)
+export TZ=UTC
 
 # Container for audio files. Match source!
 CONTAINER="mp3"
 
-# Date at time of script start
-CURRENT_YEAR=$(date +%Y)
-CURRENT_MONTH=$(date +%m)
-CURRENT_DAY=$(date +%d)
-
-# Initial directory to store recordings
-RECORDINGS_DIR="/archive/$CURRENT_YEAR/$CURRENT_MONTH/$CURRENT_DAY"
-mkdir -p "$RECORDINGS_DIR"
+# ffmpeg files each recording under ARCHIVE_DIR/YYYY/MM/DD itself, but
+# won't create missing directories. Make today's and tomorrow's up front.
+# Any % in ARCHIVE_DIR is escaped as %% below so ffmpeg's strftime leaves it
+printf -v TODAY_DIR '%s/%(%Y/%m/%d)T' "$ARCHIVE_DIR" -1
+printf -v TOMORROW_DIR '%s/%(%Y/%m/%d)T' "$ARCHIVE_DIR" $((EPOCHSECONDS + 86400))
+mkdir -p "$TODAY_DIR" "$TOMORROW_DIR"
 
-# Start ffmpeg - 1hr recordings
+# Start ffmpeg - SEGMENT_DURATION second recordings (default 1hr)
 ffmpeg \
+    -nostdin \
+    -nostats \
+    -loglevel info \
+    -fflags +nobuffer \
+    -rw_timeout 10000000 \
     -i "$STREAM_URL" \
     -f segment \
-    -segment_time 3600 \
+    -segment_time "$SEGMENT_DURATION" \
     -segment_atclocktime 1 \
     -strftime 1 \
     -c copy \
-    "$RECORDINGS_DIR/stream_%Y-%m-%dT%H-%M-%SZ.$CONTAINER" &
+    "${ARCHIVE_DIR//%/%%}/%Y/%m/%d/stream_%Y-%m-%dT%H-%M-%SZ.$CONTAINER" </dev/null &
 
 # Store PID of ffmpeg
 FFMPEG_PID=$!
 
-# Continuously update directory structure
-while true; do
-    NEW_YEAR=$(date +%Y)
-    NEW_MONTH=$(date +%m)
-    NEW_DAY=$(date +%d)
-
-    NEW_RECORDINGS_DIR="/archive/$NEW_YEAR/$NEW_MONTH/$NEW_DAY"
+# Stop ffmpeg cleanly and exit as soon as the container is told to stop
+shutdown() {
+    kill -TERM "$FFMPEG_PID" $SLEEP_PID 2>/dev/null
+    wait "$FFMPEG_PID"
+    exit 0
+}
+trap shutdown TERM INT
 
-    # Create directory if it doesn't exist
-    mkdir -p "$NEW_RECORDINGS_DIR"
+# Create the next day's directory as each UTC day begins
+while true; do
+    # Sleep until the next midnight, computed straight from the epoch.
+    # Runs in the background so a stop signal interrupts the wait
+    sleep $((86400 - EPOCHSECONDS % 86400)) &
+    SLEEP_PID=$!
 
-    # If directory has changed, move recording
-    if [ "$NEW_RECORDINGS_DIR" != "$RECORDINGS_DIR" ]; then
-        mv "$RECORDINGS_DIR"/* "$NEW_RECORDINGS_DIR"/
-        RECORDINGS_DIR="$NEW_RECORDINGS_DIR"
+    # Wake early if ffmpeg exits so the container can restart it
+    wait -n -p EXITED_PID "$SLEEP_PID" "$FFMPEG_PID"
+    STATUS=$?
+    if [ "$EXITED_PID" = "$FFMPEG_PID" ]; then
+        echo "ffmpeg exited with status $STATUS" >&2
+        kill "$SLEEP_PID" 2>/dev/null
+        exit "$STATUS"
     fi
 
-    sleep 10
+    printf -v TOMORROW_DIR '%s/%(%Y/%m/%d)T' "$ARCHIVE_DIR" $((EPOCHSECONDS + 86400))
+    mkdir -p "$TOMORROW_DIR"
 done